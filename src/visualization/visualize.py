@@ -0,0 +1,311 @@
+"""Fast plots of station data availability and multi-station weather timeseries.
+
+Plotting every daily value of an 80-year record draws ~30k points per station, almost all of which land on
+the same pixel columns as their neighbors. Instead, these functions precompute compact aggregates
+(monthly coverage, per-pixel min/max) and hand matplotlib only what is visible at the output resolution.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+
+
+def _load_station_metadata(path: Optional[Path] = None) -> pd.DataFrame:
+    """Load station names and nearest cities for the stations in the processed dataset."""
+    if path is None:
+        path = Path(__file__).resolve().parents[2] / "data/processed/station_metadata.csv"
+    elif isinstance(path, str):
+        path = Path(path)
+    assert path.exists()
+    station_meta = pd.read_csv(path, dtype={"usaf": str, "wban": str}, index_col=["usaf", "wban"])
+    return station_meta
+
+
+def _check_index(df: pd.DataFrame) -> None:
+    if tuple(df.index.names) != ("usaf", "wban", "timestamp"):
+        raise ValueError("Expect index of (usaf, wban, timestamp)")
+
+
+def _minmax_downsample(
+    timestamps: pd.DatetimeIndex, values: np.ndarray, n_buckets: int, start: pd.Timestamp, end: pd.Timestamp
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce a timeseries to the min and max of each of n_buckets equal-width time intervals.
+
+    With one bucket per horizontal pixel, a line through each bucket's extrema is visually identical to a
+    line through every point. Empty buckets become NaN so that data gaps stay visible as breaks in the line.
+
+    Args:
+        timestamps (pd.DatetimeIndex): sorted timestamps of the series
+        values (np.ndarray): values of the series
+        n_buckets (int): number of intervals, typically the axes width in pixels
+        start (pd.Timestamp): left edge of the first interval
+        end (pd.Timestamp): right edge of the last interval
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: downsampled timestamps and values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = ~np.isnan(values)
+    times = np.asarray(timestamps, dtype="datetime64[ns]")[finite]
+    values = values[finite]
+    if len(values) == 0:
+        return times, values
+    t_int = times.astype(np.int64)
+    edges = np.linspace(pd.Timestamp(start).value, pd.Timestamp(end).value, n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, t_int, side="right") - 1, 0, n_buckets - 1)
+    # buckets are contiguous because timestamps are sorted, so reduceat finds extrema in one linear pass
+    firsts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    sizes = np.diff(np.r_[firsts, len(bucket)])
+    positions = np.arange(len(values))
+    no_match = len(values)
+    is_min = values == np.repeat(np.minimum.reduceat(values, firsts), sizes)
+    is_max = values == np.repeat(np.maximum.reduceat(values, firsts), sizes)
+    argmins = np.minimum.reduceat(np.where(is_min, positions, no_match), firsts)
+    argmaxs = np.minimum.reduceat(np.where(is_max, positions, no_match), firsts)
+    # keep extrema in chronological order so lines between adjacent buckets connect correctly
+    keep = np.sort(np.stack([argmins, argmaxs], axis=1), axis=1).ravel()
+    keep = keep[np.r_[True, keep[1:] != keep[:-1]]]  # single-point buckets
+    times, values, bucket = times[keep], values[keep], bucket[keep]
+
+    # insert a NaN wherever whole buckets are skipped
+    gaps = np.flatnonzero(np.diff(bucket) > 1) + 1
+    times = np.insert(times, gaps, times[gaps - 1])
+    values = np.insert(values, gaps, np.nan)
+    return times, values
+
+
+def get_station_coverage(df: pd.DataFrame, column: str = "temp_f_mean") -> pd.Series:
+    """Calculate the fraction of days in each month with a valid observation, per station.
+
+    Args:
+        df (pd.DataFrame): GSOD data indexed by (usaf, wban, timestamp)
+        column (str, optional): column to count observations of. Defaults to "temp_f_mean".
+
+    Returns:
+        pd.Series: monthly coverage fraction indexed by (usaf, wban, timestamp)
+    """
+    _check_index(df)
+    counts = df.groupby(
+        [pd.Grouper(level="usaf"), pd.Grouper(level="wban"), pd.Grouper(level="timestamp", freq="MS")]
+    )[column].count()
+    days_in_month = counts.index.get_level_values("timestamp").days_in_month
+    coverage = counts.div(np.asarray(days_in_month)).rename("coverage")
+    return coverage
+
+
+def get_coverage_periods(coverage: pd.Series, min_coverage: float = 0.5) -> pd.DataFrame:
+    """Collapse monthly coverage into contiguous periods of adequate data, per station.
+
+    Args:
+        coverage (pd.Series): output of get_station_coverage
+        min_coverage (float, optional): minimum fraction of days in a month with data. Defaults to 0.5.
+
+    Returns:
+        pd.DataFrame: one row per period with columns [usaf, wban, start, end]. End is exclusive.
+    """
+    covered = coverage.loc[coverage.ge(min_coverage)].index.to_frame(index=False)
+    months = covered["timestamp"].dt.year * 12 + covered["timestamp"].dt.month
+    same_station = covered[["usaf", "wban"]].eq(covered[["usaf", "wban"]].shift()).all(axis=1)
+    new_period = ~(same_station & months.diff().eq(1))
+    periods = (
+        covered.groupby([covered["usaf"], covered["wban"], new_period.cumsum().rename("period")], sort=False)[
+            "timestamp"
+        ]
+        .agg(["min", "max"])
+        .reset_index(level="period", drop=True)
+        .reset_index()
+        .rename(columns={"min": "start", "max": "end"})
+    )
+    periods["end"] = periods["end"] + pd.offsets.MonthBegin(1)
+    return periods
+
+
+def plot_station_availability(
+    periods: pd.DataFrame, labels: Optional[Dict[Tuple[str, str], str]] = None, ax: Optional[Axes] = None
+) -> Axes:
+    """Draw a horizontal timeline of the data periods of each station.
+
+    Each station is a single broken_barh artist, so drawing cost scales with the number of gaps rather
+    than the number of days.
+
+    Args:
+        periods (pd.DataFrame): output of get_coverage_periods
+        labels (Optional[Dict[Tuple[str, str], str]], optional): map of (usaf, wban) to display name.
+            Defaults to "usaf-wban".
+        ax (Optional[Axes], optional): axes to draw on. Defaults to a new figure.
+
+    Returns:
+        Axes: the axes drawn on
+    """
+    if ax is None:
+        ax = Figure(figsize=(15, 4)).subplots()
+    if labels is None:
+        labels = {}
+    bars = periods.assign(
+        start=mdates.date2num(periods["start"]),
+        width=mdates.date2num(periods["end"]) - mdates.date2num(periods["start"]),
+    )
+    stations = []
+    for row, (station, station_bars) in enumerate(bars.groupby(["usaf", "wban"], sort=False)):
+        ax.broken_barh(list(zip(station_bars["start"], station_bars["width"])), (row - 0.4, 0.8))
+        stations.append(station)
+    ax.set_yticks(range(len(stations)))
+    ax.set_yticklabels([labels.get(station, "-".join(station)) for station in stations])
+    ax.set_ylim(len(stations) - 0.5, -0.5)
+    ax.xaxis_date()
+    ax.grid(axis="x")
+    return ax
+
+
+def plot_station_timeseries(
+    df: pd.DataFrame,
+    column: str,
+    labels: Optional[Dict[Tuple[str, str], str]] = None,
+    ax: Optional[Axes] = None,
+    n_buckets: Optional[int] = None,
+) -> Axes:
+    """Overlay one column of daily data from several stations, downsampled to the axes resolution.
+
+    Args:
+        df (pd.DataFrame): GSOD data indexed by (usaf, wban, timestamp)
+        column (str): column to plot, e.g. "temp_f_mean" or "precipitation_total_inches"
+        labels (Optional[Dict[Tuple[str, str], str]], optional): map of (usaf, wban) to legend name.
+            Defaults to "usaf-wban".
+        ax (Optional[Axes], optional): axes to draw on. Defaults to a new figure.
+        n_buckets (Optional[int], optional): number of time intervals to reduce each station to.
+            Defaults to the width of the axes in pixels.
+
+    Returns:
+        Axes: the axes drawn on
+    """
+    _check_index(df)
+    if ax is None:
+        ax = Figure(figsize=(15, 4)).subplots()
+    if labels is None:
+        labels = {}
+    if n_buckets is None:
+        n_buckets = max(int(ax.bbox.width), 1)
+    timestamps = df.index.get_level_values("timestamp")
+    start, end = timestamps.min(), timestamps.max()
+    for station, station_df in df[column].groupby(level=["usaf", "wban"], sort=False):
+        x, y = _minmax_downsample(
+            station_df.index.get_level_values("timestamp"), station_df.to_numpy(), n_buckets, start, end
+        )
+        ax.plot(x, y, linewidth=0.5, label=labels.get(station, "-".join(station)))
+    ax.set_xlim(start, end)
+    ax.set_ylabel(column)
+    ax.grid(True)
+    ax.legend(loc="upper left", fontsize="small")
+    return ax
+
+
+def plot_city(df: pd.DataFrame, city: str, station_meta: Optional[pd.DataFrame] = None, dpi: int = 100) -> Figure:
+    """Make a figure of station availability, temperature, and precipitation for all stations near a city.
+
+    Args:
+        df (pd.DataFrame): GSOD data indexed by (usaf, wban, timestamp)
+        city (str): name of a city in the nearest_city column of the station metadata
+        station_meta (Optional[pd.DataFrame], optional): station metadata indexed by (usaf, wban).
+            Defaults to data/processed/station_metadata.csv.
+        dpi (int, optional): figure resolution. Defaults to 100.
+
+    Returns:
+        Figure: the figure, ready to save
+    """
+    _check_index(df)
+    if station_meta is None:
+        station_meta = _load_station_metadata()
+    city_stations = station_meta.index[station_meta["nearest_city"].eq(city)]
+    subset = df.loc[df.index.droplevel("timestamp").isin(city_stations), :]
+    labels = station_meta.loc[city_stations, "name"].to_dict()
+
+    # Figure rather than pyplot: no global state, so safe to build in worker processes
+    fig = Figure(figsize=(15, 10), dpi=dpi, constrained_layout=True)
+    axes = fig.subplots(3, 1, sharex=True, gridspec_kw={"height_ratios": [1, 2, 2]})
+    periods = get_coverage_periods(get_station_coverage(subset))
+    plot_station_availability(periods, labels=labels, ax=axes[0])
+    plot_station_timeseries(subset, "temp_f_mean", labels=labels, ax=axes[1])
+    plot_station_timeseries(subset, "precipitation_total_inches", labels=labels, ax=axes[2])
+    axes[0].set_title(f"{city}: Station Data Periods, Daily Mean Temperature, and Daily Precipitation")
+    return fig
+
+
+def _render_city(df: pd.DataFrame, city: str, station_meta: pd.DataFrame, out_path: Path) -> Path:
+    fig = plot_city(df, city, station_meta=station_meta)
+    fig.savefig(out_path)
+    return out_path
+
+
+def render_all_cities(
+    df: pd.DataFrame,
+    out_dir: Optional[Path] = None,
+    station_meta: Optional[pd.DataFrame] = None,
+    cities: Optional[Sequence[str]] = None,
+    max_workers: Optional[int] = None,
+) -> List[Path]:
+    """Render and save the plot_city figure for every city in parallel.
+
+    Args:
+        df (pd.DataFrame): GSOD data indexed by (usaf, wban, timestamp)
+        out_dir (Optional[Path], optional): output directory. Defaults to reports/figures.
+        station_meta (Optional[pd.DataFrame], optional): station metadata indexed by (usaf, wban).
+            Defaults to data/processed/station_metadata.csv.
+        cities (Optional[Sequence[str]], optional): cities to render. Defaults to all cities in station_meta.
+        max_workers (Optional[int], optional): number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        List[Path]: paths of the saved figures
+    """
+    _check_index(df)
+    if out_dir is None:
+        out_dir = Path(__file__).resolve().parents[2] / "reports/figures"
+    elif isinstance(out_dir, str):
+        out_dir = Path(out_dir)
+    if station_meta is None:
+        station_meta = _load_station_metadata()
+    if cities is None:
+        cities = sorted(station_meta["nearest_city"].unique())
+    # send each worker only its own stations rather than pickling the full dataset per task
+    jobs = []
+    for city in cities:
+        city_meta = station_meta.loc[station_meta["nearest_city"].eq(city), :]
+        city_df = df.loc[df.index.droplevel("timestamp").isin(city_meta.index), :]
+        out_path = out_dir / f"{city.lower().replace(' ', '_')}_station_data.png"
+        jobs.append((city_df, city, city_meta, out_path))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_render_city, *job) for job in jobs]
+        out = [future.result() for future in futures]
+    return out
+
+
+def _load_processed_data(path: Optional[Path] = None) -> pd.DataFrame:
+    """Load the final dataset written by src/data/make_dataset.py."""
+    if path is None:
+        path = Path(__file__).resolve().parents[2] / "data/processed/historical_weather_data.csv"
+        error_msg = "Data source does not exist. Did you extract the .7z file in data/processed/?"
+        assert path.exists(), error_msg
+    elif isinstance(path, str):
+        path = Path(path)
+        assert path.exists()
+    df = pd.read_csv(
+        path,
+        usecols=["usaf", "wban", "timestamp", "temp_f_mean", "precipitation_total_inches"],
+        dtype={"usaf": str, "wban": str, "temp_f_mean": np.float32, "precipitation_total_inches": np.float32},
+        parse_dates=["timestamp"],
+        index_col=["usaf", "wban", "timestamp"],
+    )
+    return df
+
+
+def main() -> None:
+    """Render a figure for each city in data/processed/historical_weather_data.csv to reports/figures."""
+    render_all_cities(_load_processed_data())
+
+
+if __name__ == "__main__":
+    main()